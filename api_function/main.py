@@ -1,14 +1,17 @@
 import os
-import json
 import uuid
 import boto3
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime, timezone, timedelta
 import logging
 from pathlib import Path
 from urllib.parse import quote
 import re
 import html
+import zstandard
+import orjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,6 +24,13 @@ SA_KEY_ID = os.getenv('SA_KEY_ID')
 SA_SECRET = os.getenv('SA_SECRET')
 QUEUE_URL = os.getenv('QUEUE_URL')
 
+# Task records carry the full transcription, so they are stored zstd-compressed
+TASK_RECORD_ZSTD_LEVEL = 3
+
+# Yandex Disk public links: /d/ (download) and /i/ (resource info) on
+# disk.yandex.*, disk.360.yandex.* and yadi.sk
+YANDEX_DISK_LINK_RE = re.compile(r'https://(?:disk\.yandex\.[a-z]+|disk\.360\.yandex\.[a-z]+|yadi\.sk)/[di]/')
+
 # Template directory
 TEMPLATE_DIR = Path(__file__).parent / 'templates'
 
@@ -42,11 +52,32 @@ sqs_client = boto3.client(
     region_name='ru-central1'
 )
 
+# Shared HTTP session so warm instances reuse TLS connections to the Yandex Disk API
+http_session = requests.Session()
+http_session.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=16,
+    max_retries=Retry(total=3, backoff_factor=0.3)
+))
+
 
 # ============================================================================
 # Storage Functions
 # ============================================================================
 
+def encode_task_record(task_data):
+    """Serialize a task record to zstd-compressed JSON bytes"""
+    return zstandard.ZstdCompressor(level=TASK_RECORD_ZSTD_LEVEL).compress(orjson.dumps(task_data))
+
+
+def decode_task_record(response):
+    """Parse a task record from an S3 get_object response (compressed or plain)"""
+    body = response['Body'].read()
+    if response.get('ContentEncoding') == 'zstd':
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return orjson.loads(body)
+
+
 def get_tasks_from_storage():
     """Get all tasks from S3 storage"""
     try:
@@ -58,7 +89,7 @@ def get_tasks_from_storage():
                 if obj['Key'].endswith('.json'):
                     try:
                         obj_response = s3_client.get_object(Bucket=BUCKET_NAME, Key=obj['Key'])
-                        task_data = json.loads(obj_response['Body'].read().decode('utf-8'))
+                        task_data = decode_task_record(obj_response)
                         task_id = obj['Key'].replace('tasks/', '').replace('.json', '')
                         tasks[task_id] = task_data
                     except Exception as e:
@@ -133,8 +164,9 @@ def save_task_to_storage(task_id, task_data):
         s3_client.put_object(
             Bucket=BUCKET_NAME,
             Key=f'tasks/{task_id}.json',
-            Body=json.dumps(task_data),
-            ContentType='application/json'
+            Body=encode_task_record(task_data),
+            ContentType='application/json',
+            ContentEncoding='zstd'
         )
         return True
     except Exception as e:
@@ -174,10 +206,7 @@ def validate_yandex_disk_link(video_url):
     """Validate Yandex Disk public link and get file metadata"""
     try:
         # Check if this is a Yandex Disk public link
-        is_yandex_disk = bool(re.match(
-            r'https://(disk\.yandex\.[a-z]+|disk\.360\.yandex\.[a-z]+|yadi\.sk)/(d|i)/',
-            video_url
-        ))
+        is_yandex_disk = YANDEX_DISK_LINK_RE.match(video_url) is not None
 
         if not is_yandex_disk:
             return {
@@ -196,11 +225,11 @@ def validate_yandex_disk_link(video_url):
         if oauth_token:
             headers['Authorization'] = f'OAuth {oauth_token}'
 
-        response = requests.get(api_url, headers=headers, timeout=10)
+        response = http_session.get(api_url, headers=headers, timeout=10)
         logger.info(f"API response status: {response.status_code}")
 
         if response.status_code == 200:
-            metadata = response.json()
+            metadata = orjson.loads(response.content)
 
             # Check if it's a video file
             file_name = metadata.get('name', '').lower()
@@ -226,7 +255,7 @@ def validate_yandex_disk_link(video_url):
                 'message': 'Yandex Disk video file validated successfully'
             }
         else:
-            error_info = response.json() if response.content else {'error': 'Unknown error'}
+            error_info = orjson.loads(response.content) if response.content else {'error': 'Unknown error'}
             return {
                 'is_valid': False,
                 'is_yandex_disk': True,
@@ -262,7 +291,7 @@ def json_response(data, status_code=200):
     return {
         'statusCode': status_code,
         'headers': {'Content-Type': 'application/json'},
-        'body': json.dumps(data)
+        'body': orjson.dumps(data).decode('utf-8')
     }
 
 
@@ -314,7 +343,7 @@ def handle_get_all_tasks():
 def handle_submit_task(event):
     """Handle POST /api/submit"""
     try:
-        body = json.loads(event.get('body', '{}'))
+        body = orjson.loads(event.get('body', '{}'))
 
         title = body.get('title', '').strip()
         video_url = body.get('video_url', '').strip()
@@ -352,7 +381,7 @@ def handle_submit_task(event):
             try:
                 sqs_client.send_message(
                     QueueUrl=QUEUE_URL,
-                    MessageBody=json.dumps(task)
+                    MessageBody=orjson.dumps(task).decode('utf-8')
                 )
                 logger.info(f"Task {task_id} added to queue")
 
@@ -786,7 +815,7 @@ def handle_api_gateway_request(event):
             return json_response({'error': 'task_id query parameter is required'}, 400)
 
         if method == 'POST' and path == '/api/tasks/delete':
-            body = json.loads(event.get('body', '{}')) if event.get('body') else {}
+            body = orjson.loads(event.get('body', '{}')) if event.get('body') else {}
             task_id = body.get('task_id') or (event.get('queryStringParameters') or {}).get('task_id', '')
             if task_id:
                 return handle_delete_task(task_id)
@@ -24,7 +24,7 @@ data "archive_file" "worker_function_zip" {
   type        = "zip"
   source_dir  = "${path.module}/../worker_function"
   output_path = "${path.module}/worker_function.zip"
-  excludes    = ["__pycache__/*", "*.pyc", ".DS_Store"]
+  excludes    = ["__pycache__/*", "*.pyc", ".DS_Store", "test_worker_local.py"]
 }
 
 # API Serverless Function
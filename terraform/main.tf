@@ -146,6 +146,7 @@ resource "yandex_message_queue" "main" {
   name                        = local.queue_name
   visibility_timeout_seconds  = 3600
   message_retention_seconds   = 86400
+  receive_wait_time_seconds   = 20
   access_key                  = yandex_iam_service_account_static_access_key.main.access_key
   secret_key                  = yandex_iam_service_account_static_access_key.main.secret_key
 }
@@ -1,23 +1,35 @@
 import os
 import json
-import uuid
+import hashlib
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import tempfile
+import shutil
 import subprocess
 import re
 from datetime import datetime, timezone, timedelta
 import boto3
+from boto3.s3.transfer import TransferConfig
+import orjson
+import zstandard
 import time
+import threading
+from functools import lru_cache
+from collections import OrderedDict
 from botocore.exceptions import ClientError
+from botocore.client import Config
 import logging
 import html
+from io import BytesIO
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.units import inch
-from moviepy import VideoFileClip
+import imageio_ffmpeg
 from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Debug update - Fix worker queue trigger handling - Thu Dec 18 10:45:00 AM MSK 2025
 # Add math import and fallback audio extraction - Thu Dec 18 11:00:00 AM MSK 2025
@@ -31,6 +43,213 @@ from urllib.parse import quote
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Queue polling settings
+QUEUE_BATCH_SIZE = 10  # SQS maximum for a single receive/delete/visibility batch
+QUEUE_VISIBILITY_TIMEOUT = 3600
+# Tasks processed at once per invocation; tune with WORKER_CONCURRENCY to protect downstream APIs
+QUEUE_WORKER_THREADS = max(1, int(os.getenv('WORKER_CONCURRENCY', '4')))
+QUEUE_PREFETCH_SIZE = 2  # Tasks kept waiting behind the running ones so a freed thread starts immediately
+VISIBILITY_EXTEND_INTERVAL = 600  # Re-claim still running messages every 10 minutes
+QUEUE_WAIT_TICK = 30  # How often the batch loop wakes up to check deadlines
+MIN_TASK_TIME_BUDGET = 900  # Don't start a task with less than 15 minutes of function time left
+QUEUE_FALLBACK_WAIT_TIME = 1  # Timer/manual polling: an empty queue shouldn't hold a billed invocation for 20 s
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Yandex Disk public links: /d/ (download) and /i/ (resource info) on
+# disk.yandex.*, disk.360.yandex.* and yadi.sk
+YANDEX_DISK_LINK_RE = re.compile(r'https://(?:disk\.yandex\.[a-z]+|disk\.360\.yandex\.[a-z]+|yadi\.sk)/[di]/')
+
+# ffmpeg's input summary line, e.g. "  Duration: 01:23:45.67, start: 0.000000, bitrate: ..."
+FFMPEG_DURATION_RE = re.compile(r'Duration: (\d+):(\d{2}):(\d{2}(?:\.\d+)?)')
+
+# PDF layout: blank lines (possibly holding only whitespace) separate sections
+PDF_SECTION_SPLIT_RE = re.compile(r'\n\s*\n')
+
+IAM_TOKEN_URL = 'https://iam.api.cloud.yandex.net/iam/v1/tokens'
+
+# IAM tokens live ~12 hours; refresh a little early, and assume an hour when expiry is unknown
+IAM_TOKEN_REFRESH_MARGIN = 300
+IAM_TOKEN_DEFAULT_TTL = 3600
+
+# SpeechKit operation polling: start fast for short clips, back off for long lectures
+SPEECHKIT_POLL_TIMEOUT = 1800  # 30 minutes
+SPEECHKIT_POLL_MIN_INTERVAL = 2
+SPEECHKIT_POLL_MAX_INTERVAL = 15
+
+# Intermediate status writes are skipped until progress moves at least this far,
+# and are coalesced when they follow the previous write within this many seconds
+TASK_STATUS_MIN_PROGRESS_STEP = 10
+TASK_STATUS_MIN_WRITE_INTERVAL = 5
+TASK_TERMINAL_STATUSES = ('completed', 'failed')
+
+# Task records carry the full transcription, so they are stored zstd-compressed
+TASK_RECORD_ZSTD_LEVEL = 3
+
+# ReportLab font registration and paragraph styles are process-wide, so they are set up
+# once per container. Flowables such as Spacer are not shared: layout mutates them.
+_PDF_FONT_NAME = None
+_PDF_STYLES = {}
+
+# Digests of message bodies that completed in this warm container; at-least-once
+# delivery can hand the same message over again, and a rerun costs a full transcription
+RECENT_MESSAGES_LIMIT = 1024
+_RECENT_MESSAGES = OrderedDict()
+_RECENT_MESSAGES_LOCK = threading.Lock()
+
+
+def notes_content_digest(title, video_url, transcription):
+    """Content hash of everything the abstract and PDF are generated from"""
+    transcription_hash = hashlib.sha256(transcription.encode('utf-8')).hexdigest()
+    return hashlib.sha256('\0'.join((title, video_url, transcription_hash)).encode('utf-8')).hexdigest()
+
+
+def parse_message_body(body):
+    """Decode a queue message body into task data"""
+    # orjson parses str and bytes alike, without re-encoding; already decoded bodies pass through
+    task_data = body if isinstance(body, dict) else orjson.loads(body)
+    if not isinstance(task_data, dict):
+        raise TypeError(f"expected a JSON object, got {type(task_data).__name__}")
+    return task_data
+
+
+def message_dedup_key(body):
+    """Digest identifying a queue message body, computed before any parsing"""
+    if isinstance(body, dict):
+        body = orjson.dumps(body, option=orjson.OPT_SORT_KEYS)
+    elif isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).digest()
+
+
+def is_recently_processed(key):
+    """True if a message with this key already completed in this container"""
+    with _RECENT_MESSAGES_LOCK:
+        if key in _RECENT_MESSAGES:
+            _RECENT_MESSAGES.move_to_end(key)
+            return True
+        return False
+
+
+def remember_processed(key):
+    """Record a completed message, evicting the oldest beyond RECENT_MESSAGES_LIMIT"""
+    with _RECENT_MESSAGES_LOCK:
+        _RECENT_MESSAGES[key] = True
+        _RECENT_MESSAGES.move_to_end(key)
+        while len(_RECENT_MESSAGES) > RECENT_MESSAGES_LIMIT:
+            _RECENT_MESSAGES.popitem(last=False)
+
+
+def get_pdf_styles(font_name):
+    """(title, heading, body) paragraph styles for a font, built once per font"""
+    styles = _PDF_STYLES.get(font_name)
+    if styles is None:
+        sample_styles = getSampleStyleSheet()
+
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=sample_styles['Title'],
+            fontName=font_name,
+            fontSize=16,
+            leading=22
+        )
+
+        heading_style = ParagraphStyle(
+            'CustomHeading',
+            parent=sample_styles['Heading1'],
+            fontName=font_name,
+            fontSize=12,
+            leading=16
+        )
+
+        normal_style = ParagraphStyle(
+            'CustomNormal',
+            parent=sample_styles['Normal'],
+            fontName=font_name,
+            fontSize=10,
+            leading=14
+        )
+
+        styles = _PDF_STYLES[font_name] = (title_style, heading_style, normal_style)
+    return styles
+
+
+# Retried and duplicate tasks carry the same URL, so its classification and encoding are memoized
+@lru_cache(maxsize=256)
+def is_yandex_disk_url(url):
+    """Check if URL is a Yandex Disk public link"""
+    return YANDEX_DISK_LINK_RE.match(url) is not None
+
+
+@lru_cache(maxsize=256)
+def yandex_disk_public_key(url):
+    """URL-encode a public link for the Yandex Disk API public_key parameter"""
+    return quote(url, safe='')
+
+
+def iter_pdf_blocks(text):
+    """Split lecture notes into (is_heading, text, space_after) blocks for the PDF
+
+    Blank lines separate sections; within a section, consecutive body lines are
+    joined into one paragraph and a heading line closes the paragraph before it.
+    """
+    for section in PDF_SECTION_SPLIT_RE.split(text):
+        body_lines = []
+
+        for line in section.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            if line.isupper() and len(line) < 50:
+                # Likely a heading - flush the text collected before it
+                if body_lines:
+                    yield False, ' '.join(body_lines), 0
+                    body_lines = []
+                yield True, line, 12
+            else:
+                body_lines.append(line)
+
+        if body_lines:
+            yield False, ' '.join(body_lines), 6
+
+
+def get_remaining_time(context):
+    """Seconds left before the function deadline, or None if the runtime doesn't expose it"""
+    get_remaining_time_in_millis = getattr(context, 'get_remaining_time_in_millis', None)
+    if get_remaining_time_in_millis is None:
+        return None
+    return get_remaining_time_in_millis() / 1000
+
+
+def response_preview(response, limit=512):
+    """First bytes of a response body for logs, without decoding the whole (possibly huge) body"""
+    return response.content[:limit].decode('utf-8', 'replace')
+
+
+def save_response_to_file(response, path):
+    """Write a streamed HTTP response body to disk in 1 MB chunks"""
+    # Read the raw stream directly (instead of iter_content) while still undoing gzip/deflate.
+    # Not readinto: urllib3 1.26 fails filling a fixed buffer when decoded chunks outgrow it.
+    response.raw.decode_content = True
+    with open(path, 'wb') as f:
+        shutil.copyfileobj(response.raw, f, DOWNLOAD_CHUNK_SIZE)
+
+
+def encode_task_record(task_data):
+    """Serialize a task record to zstd-compressed JSON bytes"""
+    # Compressor instances are not thread-safe, so each call gets its own
+    return zstandard.ZstdCompressor(level=TASK_RECORD_ZSTD_LEVEL).compress(orjson.dumps(task_data))
+
+
+def decode_task_record(response):
+    """Parse a task record from an S3 get_object response (compressed or plain)"""
+    body = response['Body'].read()
+    if response.get('ContentEncoding') == 'zstd':
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return orjson.loads(body)
+
+
 class LectureNotesWorker:
     def __init__(self):
         self.ydb_endpoint = os.getenv('YDB_ENDPOINT')
@@ -41,33 +260,89 @@ class LectureNotesWorker:
         self.speechkit_folder_id = os.getenv('FOLDER_ID')
         self.queue_url = os.getenv('QUEUE_URL')
 
-        # Initialize Yandex Storage client
+        # Objects are uploaded public-read, so their public URL is just this prefix plus the key
+        self._url_prefix = f"https://storage.yandexcloud.net/{self.storage_bucket}/"
+
+        # Credentials are resolved once per worker, not once per task
+        self.speechkit_api_key = os.getenv('SPEECHKIT_API_KEY')
+        self.yagpt_api_key = os.getenv('YAGPT_API_KEY') or self.speechkit_api_key
+        self._iam_token = None
+        self._iam_expiry = 0
+        self._iam_lock = threading.Lock()
+
+        # Task records seeded from storage once per task:
+        # task_id -> (task_data, last written (status, progress, monotonic time))
+        self._task_cache = {}
+
+        # Initialize Yandex Storage client (SigV4 so it can also presign URLs for SpeechKit).
+        # The pool is sized for parallel multipart parts from several tasks at once;
+        # short timeouts plus adaptive retries keep a throttled or stuck request from stalling a task.
         self.s3_client = boto3.client(
             's3',
             endpoint_url='https://storage.yandexcloud.net',
             aws_access_key_id=self.storage_access_key,
             aws_secret_access_key=self.storage_secret_key,
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=64,
+                retries={'max_attempts': 5, 'mode': 'adaptive'},
+                connect_timeout=3,
+                read_timeout=30,
+                tcp_keepalive=True
+            ),
             region_name='ru-central1'
         )
 
-        # Initialize SQS client for message queue
-        self.sqs_client = boto3.client(
-            'sqs',
-            endpoint_url='https://message-queue.api.cloud.yandex.net',
-            aws_access_key_id=self.storage_access_key,
-            aws_secret_access_key=self.storage_secret_key,
-            region_name='ru-central1'
+        # Large files are sent as parallel 8 MB multipart chunks
+        self.transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=8,
+            use_threads=True
         )
 
+        # SQS client for message queue - created on first use, triggered invocations never need it
+        self._sqs_client = None
+        self._sqs_client_lock = threading.Lock()
+
+        # Shared HTTP session: keeps TLS connections to Yandex APIs alive between calls.
+        # Few hosts, but several concurrent tasks each talking to them
+        self.http = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=16,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=3,
+                backoff_factor=0.3,
+                status_forcelist=[429, 500, 502, 503, 504],
+                raise_on_status=False  # Hand the last response back so callers keep their own status handling
+            )
+        )
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)  # Plain-HTTP video links get the same pooling and retries
+
         logger.info("Worker initialized successfully")
 
+    @property
+    def sqs_client(self):
+        """SQS client for message queue, created on first use"""
+        if self._sqs_client is None:
+            with self._sqs_client_lock:
+                if self._sqs_client is None:
+                    self._sqs_client = boto3.client(
+                        'sqs',
+                        endpoint_url='https://message-queue.api.cloud.yandex.net',
+                        aws_access_key_id=self.storage_access_key,
+                        aws_secret_access_key=self.storage_secret_key,
+                        region_name='ru-central1'
+                    )
+        return self._sqs_client
+
     def is_yandex_disk_link(self, url):
         """Check if URL is a Yandex Disk public link"""
-        # Handle all Yandex Disk URL formats: /d/ (download), /i/ (resource info)
-        # Matches: disk.yandex.*, disk.360.yandex.*, yadi.sk
         if not url:
             return False
-        return bool(re.match(r'https://(disk\.yandex\.[a-z]+|disk\.360\.yandex\.[a-z]+|yadi\.sk)/(d|i)/', url))
+        return is_yandex_disk_url(url)
 
     def download_yandex_disk_video(self, video_url, task_id, temp_dir, video_path):
         """Download video from Yandex Disk public link using REST API"""
@@ -77,34 +352,34 @@ class LectureNotesWorker:
 
             # Use Yandex Disk REST API to get direct download URL
             # The API accepts the full URL as public_key parameter (must be URL-encoded)
-            encoded_key = quote(video_url, safe='')
+            encoded_key = yandex_disk_public_key(video_url)
             api_url = f"https://cloud-api.yandex.net/v1/disk/public/resources/download?public_key={encoded_key}"
             logger.info(f"  API call: GET /public/resources/download")
             logger.info(f"  Original video URL: {video_url}")
             logger.info(f"  Encoded public_key: {encoded_key[:100]}...")
             logger.info(f"  Full API URL: {api_url[:150]}...")
 
-            response = requests.get(api_url, timeout=10)
+            response = self.http.get(api_url, timeout=10)
 
             logger.info(f"  API response status: {response.status_code}")
 
             if response.status_code == 404:
-                error_msg = response.text
-                logger.error(f"  ERROR: Resource not found (404)")
-                logger.error(f"  API response: {error_msg[:200]}")
+                error_msg = response_preview(response, 200)
+                logger.error("  ERROR: Resource not found (404)")
+                logger.error("  API response: %s", error_msg)
                 raise Exception(
                     f"Yandex Disk resource not found. This could mean:\n"
                     f"1. The link has expired or was deleted\n"
                     f"2. Invalid URL format\n"
                     f"3. Resource is private and not publicly accessible\n"
-                    f"API Error: {error_msg[:200]}"
+                    f"API Error: {error_msg}"
                 )
             elif response.status_code != 200:
-                logger.error(f"  ERROR: API returned {response.status_code}")
-                logger.error(f"  API response: {response.text[:200]}")
+                logger.error("  ERROR: API returned %s", response.status_code)
+                logger.error("  API response: %s", response_preview(response, 200))
                 raise Exception(f"Yandex Disk API error: {response.status_code}")
 
-            download_info = response.json()
+            download_info = orjson.loads(response.content)
             download_url = download_info.get('href')
 
             if not download_url:
@@ -114,7 +389,7 @@ class LectureNotesWorker:
             logger.info(f"  Starting file download...")
 
             # Download the actual video file
-            download_response = requests.get(
+            download_response = self.http.get(
                 download_url,
                 stream=True,
                 timeout=300,  # 5 minutes for large files
@@ -124,12 +399,7 @@ class LectureNotesWorker:
             download_response.raise_for_status()
 
             # Save the file
-            downloaded_size = 0
-            with open(video_path, 'wb') as f:
-                for chunk in download_response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
+            save_response_to_file(download_response, video_path)
 
             file_size = os.path.getsize(video_path)
             file_size_mb = file_size / (1024 * 1024)
@@ -147,8 +417,22 @@ class LectureNotesWorker:
             logger.error(f"Failed to download from Yandex Disk: {e}")
             raise Exception(f"Yandex Disk download failed: {e}")
 
-    def get_iam_token(self):
-        """Get IAM token for SpeechKit using multiple authentication methods"""
+    def get_iam_token(self, refresh=False):
+        """Get IAM token for SpeechKit, reusing the cached token until shortly before it expires"""
+        with self._iam_lock:
+            # Monotonic clock: wall-clock jumps in a long-lived container can't stretch or cut the token's life
+            if not refresh and self._iam_token and time.monotonic() < self._iam_expiry - IAM_TOKEN_REFRESH_MARGIN:
+                return self._iam_token
+
+            self._iam_token, lifetime = self._fetch_iam_token()
+            self._iam_expiry = time.monotonic() + lifetime
+            return self._iam_token
+
+    def _fetch_iam_token(self):
+        """Get IAM token for SpeechKit using multiple authentication methods
+
+        Returns (token, seconds until it expires), or (None, 0) if every method failed.
+        """
         try:
             logger.info("Attempting to get IAM token for SpeechKit")
 
@@ -158,8 +442,8 @@ class LectureNotesWorker:
                 try:
                     logger.info("Attempting OAuth token exchange for IAM token")
 
-                    response = requests.post(
-                        'https://iam.api.cloud.yandex.net/iam/v1/tokens',
+                    response = self.http.post(
+                        IAM_TOKEN_URL,
                         headers={'Content-Type': 'application/json'},
                         json={'yandexPassportOauthToken': yc_token},
                         timeout=15
@@ -168,69 +452,41 @@ class LectureNotesWorker:
                     logger.info(f"IAM API response status: {response.status_code}")
 
                     if response.status_code == 200:
-                        token_data = response.json()
+                        token_data = orjson.loads(response.content)
                         iam_token = token_data.get('iamToken')
                         if iam_token:
                             logger.info(f"SUCCESS: Got IAM token via OAuth exchange, length: {len(iam_token)}")
-                            return iam_token
+                            return iam_token, self._parse_iam_lifetime(token_data.get('expiresAt'))
                         else:
                             logger.error(f"No iamToken in response: {token_data}")
                     else:
-                        logger.error(f"IAM token exchange failed: {response.status_code} - {response.text}")
+                        logger.error("IAM token exchange failed: %s - %s", response.status_code, response_preview(response))
 
                 except Exception as e:
                     logger.error(f"OAuth token exchange error: {e}")
 
-            # METHOD 2: Try using the YC CLI with service account impersonation
-            service_account_id = os.getenv('SERVICE_ACCOUNT_ID')
-            if service_account_id:
-                try:
-                    logger.info(f"Trying yc CLI with service account: {service_account_id}")
-
-                    # Create a temporary config with the OAuth token
-                    temp_config = tempfile.mktemp()
-                    with open(temp_config, 'w') as f:
-                        f.write(f'token: {yc_token}\n')
-
-                    result = subprocess.run(
-                        ['yc', '--config', temp_config, 'iam', 'create-token', '--service-account-id', service_account_id],
-                        capture_output=True,
-                        text=True,
-                        timeout=30
-                    )
-
-                    # Clean up temp config
-                    try:
-                        os.remove(temp_config)
-                    except:
-                        pass
-
-                    if result.returncode == 0:
-                        token = result.stdout.strip()
-                        if token and len(token) > 50:
-                            logger.info(f"SUCCESS: Got IAM token using yc CLI, length: {len(token)}")
-                            return token
-                        else:
-                            logger.error(f"Invalid token from yc CLI: '{token}'")
-                    else:
-                        logger.error(f"yc CLI failed: {result.stderr}")
-
-                except Exception as e:
-                    logger.error(f"yc CLI method failed: {e}")
-
-            # METHOD 3: Use YC_TOKEN directly if it looks like an IAM token
+            # METHOD 2: Use YC_TOKEN directly if it looks like an IAM token
             if yc_token and yc_token.startswith('t1.'):
                 # YC_TOKEN is already an IAM token (starts with t1.)
                 logger.info(f"Using YC_TOKEN directly as IAM token, length: {len(yc_token)}")
-                return yc_token
+                return yc_token, IAM_TOKEN_DEFAULT_TTL
 
             # All methods failed
             logger.error("FAILED: All IAM token generation methods failed")
-            return None
+            return None, 0
 
         except Exception as e:
             logger.error(f"FAILED: Error in get_iam_token: {e}")
-            return None
+            return None, 0
+
+    def _parse_iam_lifetime(self, expires_at):
+        """Seconds until IAM expiresAt (RFC3339, e.g. 2025-12-18T20:45:00.123456789Z)"""
+        try:
+            # Python can't parse nanosecond fractions, and second precision is plenty here
+            expiry = datetime.strptime(expires_at[:19], '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+            return expiry.timestamp() - time.time()
+        except (TypeError, ValueError):
+            return IAM_TOKEN_DEFAULT_TTL
 
     def download_video(self, video_url, task_id):
         """Download video from URL with enhanced error handling and Yandex Disk support"""
@@ -255,7 +511,7 @@ class LectureNotesWorker:
 
             # Try with SSL verification first, then fallback
             try:
-                response = requests.get(
+                response = self.http.get(
                     video_url,
                     headers=headers,
                     stream=True,
@@ -264,7 +520,7 @@ class LectureNotesWorker:
                 )
             except requests.exceptions.SSLError:
                 logger.warning("SSL verification failed, trying without verification")
-                response = requests.get(
+                response = self.http.get(
                     video_url,
                     headers=headers,
                     stream=True,
@@ -283,12 +539,7 @@ class LectureNotesWorker:
                 logger.info("No content-length header, but status is 200 - continuing")
 
             # Download the file
-            downloaded_size = 0
-            with open(video_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:  # filter out keep-alive new chunks
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
+            save_response_to_file(response, video_path)
 
             file_size = os.path.getsize(video_path)
             logger.info(f"Video downloaded to {video_path}, size: {file_size} bytes")
@@ -309,27 +560,36 @@ class LectureNotesWorker:
             return None, None
 
     def convert_to_mp3(self, video_path, task_id):
-        """Convert video to MP3 using moviepy"""
+        """Convert video to MP3 by running the bundled ffmpeg directly"""
         try:
-            logger.info("Converting video to MP3 using moviepy")
+            logger.info("Converting video to MP3 using ffmpeg")
 
             # Define output path for MP3
             mp3_path = os.path.join(os.path.dirname(video_path) or '/tmp', f"{task_id}.mp3")
 
-            # Load video and extract audio
-            video = VideoFileClip(video_path)
-            audio = video.audio
-
-            if audio is None:
-                raise Exception("Video has no audio track")
-
-            # Write audio to MP3
+            # Only the first audio stream is decoded; the video is never touched.
+            # Mono 64 kbps is plenty for lecture speech and for SpeechKit.
             logger.info(f"Writing audio to MP3: {mp3_path}")
-            audio.write_audiofile(mp3_path, codec='libmp3lame', bitrate='192k', logger=None)
+            result = subprocess.run(
+                [
+                    imageio_ffmpeg.get_ffmpeg_exe(),
+                    '-nostdin', '-y', '-loglevel', 'error',
+                    '-threads', '0',
+                    '-i', video_path,
+                    '-map', '0:a:0', '-vn',
+                    '-ac', '1',
+                    '-c:a', 'libmp3lame', '-b:a', '64k',
+                    mp3_path
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE
+            )
 
-            # Close video to free resources
-            video.close()
-            audio.close()
+            if result.returncode != 0:
+                error_output = result.stderr.decode('utf-8', 'replace').strip()
+                if 'matches no streams' in error_output:
+                    raise Exception("Video has no audio track")
+                raise Exception(f"ffmpeg exited with code {result.returncode}: {error_output[-500:]}")
 
             # Verify the file was created
             if not os.path.exists(mp3_path):
@@ -346,16 +606,20 @@ class LectureNotesWorker:
             logger.error(f"Failed to convert to MP3: {e}")
             raise Exception(f"MP3 conversion failed: {e}")
 
-    def transcribe_audio_speechkit(self, audio_path, task_id):
-        """Transcribe audio using Yandex SpeechKit v2 Async API (full audio)"""
+    def transcribe_audio_speechkit(self, audio_storage_key, task_id):
+        """Transcribe audio using Yandex SpeechKit v2 Async API (full audio)
+
+        The audio must already be in object storage under audio_storage_key;
+        SpeechKit reads it from there, so it is never re-uploaded or loaded into memory.
+        """
         try:
             logger.info("=" * 80)
             logger.info("Starting transcription with SpeechKit v2 Async API")
             logger.info(f"Task ID: {task_id}")
-            logger.info(f"Audio path: {audio_path}")
+            logger.info(f"Audio storage key: {audio_storage_key}")
 
             # Use API Key for authentication (static, no need for dynamic token creation)
-            api_key = os.getenv('SPEECHKIT_API_KEY')
+            api_key = self.speechkit_api_key
             logger.info(f"SPEECHKIT_API_KEY env var exists: {api_key is not None}")
             logger.info(f"SPEECHKIT_API_KEY length: {len(api_key) if api_key else 0}")
             logger.info(f"SPEECHKIT_API_KEY prefix: {api_key[:10]}..." if api_key else "NO API KEY")
@@ -363,34 +627,12 @@ class LectureNotesWorker:
             if not api_key:
                 raise Exception("SPEECHKIT_API_KEY environment variable not set")
 
-            # Step 1: Upload audio file to Yandex Object Storage
+            # Step 1: Generate presigned URL for the already uploaded audio file
             logger.info("-" * 40)
-            logger.info("Step 1: Uploading audio to Yandex Storage for SpeechKit")
-            audio_storage_key = f"audio/{task_id}.mp3"
-            logger.info(f"Audio storage key: {audio_storage_key}")
+            logger.info("Step 1: Generating presigned URL")
             logger.info(f"Storage bucket: {self.storage_bucket}")
 
-            audio_public_url = self.upload_to_storage(audio_path, audio_storage_key)
-            logger.info(f"Public URL: {audio_public_url}")
-
-            if not audio_public_url:
-                raise Exception("Failed to upload audio to storage for SpeechKit")
-
-            # Step 2: Generate presigned URL for the audio file
-            logger.info("-" * 40)
-            logger.info("Step 2: Generating presigned URL")
-            from botocore.client import Config
-
-            s3_client = boto3.client(
-                's3',
-                endpoint_url='https://storage.yandexcloud.net',
-                aws_access_key_id=self.storage_access_key,
-                aws_secret_access_key=self.storage_secret_key,
-                config=Config(signature_version='s3v4'),
-                region_name='ru-central1'
-            )
-
-            presigned_url = s3_client.generate_presigned_url(
+            presigned_url = self.s3_client.generate_presigned_url(
                 'get_object',
                 Params={'Bucket': self.storage_bucket, 'Key': audio_storage_key},
                 ExpiresIn=3600
@@ -399,9 +641,9 @@ class LectureNotesWorker:
             logger.info(f"Presigned URL generated (length: {len(presigned_url)})")
             logger.info(f"Presigned URL (first 150 chars): {presigned_url[:150]}")
 
-            # Step 3: Start asynchronous transcription using v2 API
+            # Step 2: Start asynchronous transcription using v2 API
             logger.info("-" * 40)
-            logger.info("Step 3: Calling SpeechKit Async API v2")
+            logger.info("Step 2: Calling SpeechKit Async API v2")
 
             url = "https://transcribe.api.cloud.yandex.net/speech/stt/v2/longRunningRecognize"
             logger.info(f"Full API URL: {url}")
@@ -427,41 +669,46 @@ class LectureNotesWorker:
             logger.info(f"Request body: {json.dumps(request_data, indent=2)}")
 
             logger.info("Sending POST request to SpeechKit API...")
-            response = requests.post(url, headers=headers, json=request_data, timeout=30)
+            response = self.http.post(url, headers=headers, json=request_data, timeout=30)
 
             logger.info("-" * 40)
-            logger.info(f"API Response Status Code: {response.status_code}")
-            logger.info(f"API Response Headers: {dict(response.headers)}")
-            logger.info(f"API Response Body: {response.text}")
+            logger.info("API Response Status Code: %s", response.status_code)
+            logger.info("API Response Headers: %s", response.headers)
 
             if response.status_code != 200:
-                logger.error(f"SpeechKit API request FAILED!")
-                logger.error(f"Status: {response.status_code}")
-                logger.error(f"Response: {response.text}")
-                raise Exception(f"SpeechKit API failed: {response.status_code} - {response.text}")
+                error_body = response_preview(response)
+                logger.error("SpeechKit API request FAILED!")
+                logger.error("Status: %s", response.status_code)
+                logger.error("Response: %s", error_body)
+                raise Exception(f"SpeechKit API failed: {response.status_code} - {error_body}")
+
+            logger.info("API Response Body: %s", response_preview(response))
 
-            operation_id = response.json().get('id')
+            operation_id = orjson.loads(response.content).get('id')
             if not operation_id:
-                raise Exception(f"No operation ID in response: {response.text[:200]}")
+                raise Exception(f"No operation ID in response: {response_preview(response, 200)}")
 
             logger.info(f"Transcription operation started: {operation_id}")
 
-            # Step 4: Poll for operation completion
+            # Step 3: Poll for operation completion
             operation_url = f"https://operation.api.cloud.yandex.net/operations/{operation_id}"
-            max_attempts = 360  # 30 minutes timeout (360 * 5 seconds)
+            deadline = time.monotonic() + SPEECHKIT_POLL_TIMEOUT
+            poll_interval = SPEECHKIT_POLL_MIN_INTERVAL
+            attempt = 0
 
-            for attempt in range(max_attempts):
-                if attempt % 10 == 0:  # Log every 30 seconds
-                    logger.info(f"Checking transcription status... (attempt {attempt + 1}/{max_attempts})")
+            while time.monotonic() < deadline:
+                attempt += 1
+                if attempt % 10 == 1:  # Log every 10th check
+                    logger.info(f"Checking transcription status... (attempt {attempt}, interval {poll_interval}s)")
 
-                op_response = requests.get(operation_url, headers={'Authorization': f'Api-Key {api_key}'}, timeout=10)
+                op_response = self.http.get(operation_url, headers={'Authorization': f'Api-Key {api_key}'}, timeout=10)
 
                 if op_response.status_code != 200:
                     logger.error(f"Failed to check operation status: {op_response.status_code}")
-                    time.sleep(5)
+                    time.sleep(poll_interval)
                     continue
 
-                operation_data = op_response.json()
+                operation_data = orjson.loads(op_response.content)
                 done = operation_data.get('done', False)
 
                 if done:
@@ -494,8 +741,9 @@ class LectureNotesWorker:
                     logger.info(f"Transcription preview: {transcription[:200]}...")
                     return transcription
 
-                # Wait before next poll
-                time.sleep(5)
+                # Wait before next poll, backing off while the operation is still running
+                time.sleep(poll_interval)
+                poll_interval = min(poll_interval * 2, SPEECHKIT_POLL_MAX_INTERVAL)
 
             raise Exception("Transcription timeout - operation took too long")
 
@@ -509,26 +757,6 @@ class LectureNotesWorker:
             logger.error("=" * 80)
             raise Exception(f"SpeechKit transcription error: {e}")
 
-    def generate_service_account_token(self):
-        """Generate IAM token for service account using available methods"""
-        try:
-            # Try to use yc command if available
-            result = subprocess.run(
-                ['yc', 'iam', 'create-token', '--service-account-id', os.getenv('SERVICE_ACCOUNT_ID', '')],
-                capture_output=True,
-                text=True,
-                timeout=30
-            )
-            if result.returncode == 0:
-                token = result.stdout.strip()
-                if token:
-                    logger.info("Generated IAM token using yc command")
-                    return token
-        except Exception as e:
-            logger.debug(f"yc command method failed: {e}")
-
-        return None
-
     # REMOVED: create_sample_transcription method - NO MORE MOCK DATA
 
     def upload_to_storage(self, file_path, object_name):
@@ -536,15 +764,26 @@ class LectureNotesWorker:
         try:
             logger.info(f"Uploading {file_path} to storage as {object_name}")
 
-            self.s3_client.upload_file(
-                file_path,
-                self.storage_bucket,
-                object_name,
-                ExtraArgs={'ACL': 'public-read'}
-            )
+            with open(file_path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size < self.transfer_config.multipart_threshold:
+                    # Small file: a single streamed PUT, skipping the transfer manager's threads
+                    self.s3_client.put_object(
+                        Bucket=self.storage_bucket,
+                        Key=object_name,
+                        Body=f,
+                        ACL='public-read'
+                    )
+                else:
+                    self.s3_client.upload_fileobj(
+                        f,
+                        self.storage_bucket,
+                        object_name,
+                        ExtraArgs={'ACL': 'public-read'},
+                        Config=self.transfer_config
+                    )
 
             # Generate public URL
-            file_url = f"https://storage.yandexcloud.net/{self.storage_bucket}/{object_name}"
+            file_url = self._url_prefix + object_name
 
             logger.info(f"File uploaded successfully: {file_url}")
             return file_url
@@ -553,46 +792,102 @@ class LectureNotesWorker:
             logger.error(f"Failed to upload to storage: {e}")
             return None
 
-    def upload_text_to_storage(self, content, object_name, content_type='text/plain'):
-        """Upload text content directly to Yandex Object Storage"""
+    def upload_bytes_to_storage(self, data, object_name, content_type='application/octet-stream'):
+        """Upload in-memory bytes to Yandex Object Storage without a temp file"""
         try:
-            logger.info(f"Uploading text content to storage as {object_name}")
-
-            # Convert string to bytes
-            from io import BytesIO
-            content_bytes = content.encode('utf-8')
-
-            # Ensure charset is specified in Content-Type
-            if 'charset' not in content_type:
-                content_type = f"{content_type}; charset=utf-8"
+            logger.info(f"Uploading {len(data)} bytes to storage as {object_name}")
 
             self.s3_client.put_object(
                 Bucket=self.storage_bucket,
                 Key=object_name,
-                Body=content_bytes,
+                Body=data,
                 ContentType=content_type,
                 ACL='public-read'
             )
 
             # Generate public URL
-            file_url = f"https://storage.yandexcloud.net/{self.storage_bucket}/{object_name}"
+            file_url = self._url_prefix + object_name
 
-            logger.info(f"Text content uploaded successfully: {file_url}")
+            logger.info(f"Content uploaded successfully: {file_url}")
             return file_url
 
         except Exception as e:
-            logger.error(f"Failed to upload text to storage: {e}")
+            logger.error(f"Failed to upload content to storage: {e}")
+            return None
+
+    def upload_text_to_storage(self, content, object_name, content_type='text/plain'):
+        """Upload text content directly to Yandex Object Storage"""
+        # Ensure charset is specified in Content-Type
+        if 'charset' not in content_type:
+            content_type = f"{content_type}; charset=utf-8"
+
+        return self.upload_bytes_to_storage(content.encode('utf-8'), object_name, content_type)
+
+    def restore_cached_notes(self, digest, task_id):
+        """Copy previously generated notes for the same content to this task's keys.
+
+        Returns (abstract_url, pdf_url), or None when nothing is cached.
+        """
+        cached_keys = {
+            f"abstracts/by-hash/{digest}.md": f"abstracts/{task_id}.md",
+            f"notes/by-hash/{digest}.pdf": f"notes/{task_id}_lecture_notes.pdf"
+        }
+        try:
+            for cached_key in cached_keys:
+                self.s3_client.head_object(Bucket=self.storage_bucket, Key=cached_key)
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                logger.error(f"Failed to check notes cache: {e}")
+            return None
+
+        try:
+            # Server-side copies: the cached objects never leave storage
+            for cached_key, task_key in cached_keys.items():
+                self.s3_client.copy_object(
+                    Bucket=self.storage_bucket,
+                    Key=task_key,
+                    CopySource={'Bucket': self.storage_bucket, 'Key': cached_key},
+                    ACL='public-read'
+                )
+        except Exception as e:
+            logger.error(f"Failed to reuse cached notes: {e}")
             return None
 
-    def update_task_status(self, task_id, status, progress, message, result=None):
-        """Update task status in persistent storage"""
+        logger.info(f"Reused cached notes {digest} for task {task_id}")
+        return tuple(
+            self._url_prefix + task_key
+            for task_key in cached_keys.values()
+        )
+
+    def cache_generated_notes(self, digest, task_id):
+        """Keep a content-addressed copy of this task's notes for later identical tasks"""
         try:
-            # Get current task data from S3
-            response = self.s3_client.get_object(
-                Bucket=self.storage_bucket,
-                Key=f'tasks/{task_id}.json'
-            )
-            task_data = json.loads(response['Body'].read().decode('utf-8'))
+            for task_key, cached_key in (
+                (f"abstracts/{task_id}.md", f"abstracts/by-hash/{digest}.md"),
+                (f"notes/{task_id}_lecture_notes.pdf", f"notes/by-hash/{digest}.pdf")
+            ):
+                self.s3_client.copy_object(
+                    Bucket=self.storage_bucket,
+                    Key=cached_key,
+                    CopySource={'Bucket': self.storage_bucket, 'Key': task_key}
+                )
+        except Exception as e:
+            logger.error(f"Failed to cache generated notes: {e}")
+
+    def update_task_status(self, task_id, status, progress, message, result=None, force=False):
+        """Update task status in persistent storage; force skips write coalescing"""
+        try:
+            cached = self._task_cache.get(task_id)
+            if cached is None:
+                # First update for this task: read the record the API created once
+                response = self.s3_client.get_object(
+                    Bucket=self.storage_bucket,
+                    Key=f'tasks/{task_id}.json'
+                )
+                task_data = decode_task_record(response)
+                last_written = None
+            else:
+                task_data, last_written = cached
 
             # Update task status
             task_data['status'] = status
@@ -602,52 +897,214 @@ class LectureNotesWorker:
             if result:
                 task_data.update(result)
 
+            if status in TASK_TERMINAL_STATUSES:
+                self._task_cache.pop(task_id, None)
+            else:
+                self._task_cache[task_id] = (task_data, last_written)
+
+            # Small or rapid-fire progress ticks within the same status are kept in memory;
+            # the next persisted write carries the latest progress and message along
+            if not (result or force) and last_written is not None and last_written[0] == status:
+                last_progress, last_write_time = last_written[1:]
+                if (abs(progress - last_progress) < TASK_STATUS_MIN_PROGRESS_STEP
+                        or time.monotonic() - last_write_time < TASK_STATUS_MIN_WRITE_INTERVAL):
+                    logger.info(f"Task {task_id}: {status} ({progress}%) - {message} (not persisted)")
+                    return
+
+            if status in TASK_TERMINAL_STATUSES and last_written is not None:
+                # The final record is written from the cache, so make sure the task wasn't
+                # deleted through the API meanwhile; a blind put would bring it back
+                try:
+                    self.s3_client.head_object(Bucket=self.storage_bucket, Key=f'tasks/{task_id}.json')
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                        raise
+                    self._task_cache.pop(task_id, None)
+                    logger.info(f"Task {task_id} was deleted, not saving status {status}")
+                    return
+
             # Save updated task back to S3
             self.s3_client.put_object(
                 Bucket=self.storage_bucket,
                 Key=f'tasks/{task_id}.json',
-                Body=json.dumps(task_data),
-                ContentType='application/json'
+                Body=encode_task_record(task_data),
+                ContentType='application/json',
+                ContentEncoding='zstd'
             )
 
+            if status not in TASK_TERMINAL_STATUSES:
+                self._task_cache[task_id] = (task_data, (status, progress, time.monotonic()))
+
             logger.info(f"Task {task_id}: {status} ({progress}%) - {message}")
 
         except Exception as e:
             logger.error(f"Failed to update task status: {e}")
 
-    def get_task_from_queue(self):
-        """Get task from message queue"""
+    def get_tasks_from_queue(self, max_messages=QUEUE_BATCH_SIZE, wait_time_seconds=20, skip_keys=()):
+        """Get a batch of tasks from message queue as (task_data, receipt_handle, dedup_key) triples
+
+        Repeats within the batch, messages whose key is in skip_keys and redeliveries
+        of messages already completed in this container are deleted instead of returned.
+        """
         try:
             response = self.sqs_client.receive_message(
                 QueueUrl=self.queue_url,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=20,
-                VisibilityTimeout=3600
+                MaxNumberOfMessages=max_messages,
+                WaitTimeSeconds=wait_time_seconds,
+                VisibilityTimeout=QUEUE_VISIBILITY_TIMEOUT
             )
 
-            if 'Messages' in response and response['Messages']:
-                message = response['Messages'][0]
-                task_data = json.loads(message['Body'])
-                receipt_handle = message['ReceiptHandle']
+            tasks = []
+            task_keys = set(skip_keys)
+            duplicates = []
+            for message in response.get('Messages', []):
+                try:
+                    key = message_dedup_key(message['Body'])
+                    if key in task_keys or is_recently_processed(key):
+                        duplicates.append(message['ReceiptHandle'])
+                        continue
+                    task_data = parse_message_body(message['Body'])
+                except (TypeError, orjson.JSONDecodeError) as e:
+                    # One bad body must not hide the rest of the batch
+                    logger.error(f"Skipping malformed queue message {message.get('MessageId')}: {e}")
+                    continue
+                task_keys.add(key)
+                tasks.append((task_data, message['ReceiptHandle'], key))
 
-                return task_data, receipt_handle
-            else:
-                return None, None
+            if duplicates:
+                # A skipped duplicate is acknowledged just like a completed task
+                logger.info("Deleting %d duplicate queue messages", len(duplicates))
+                self.delete_messages_from_queue(duplicates)
 
-        except Exception as e:
-            logger.error(f"Failed to get task from queue: {e}")
-            return None, None
+            return tasks
 
-    def delete_message_from_queue(self, receipt_handle):
-        """Delete processed message from queue"""
-        try:
-            self.sqs_client.delete_message(
-                QueueUrl=self.queue_url,
-                ReceiptHandle=receipt_handle
-            )
-            logger.info("Message deleted from queue")
         except Exception as e:
-            logger.error(f"Failed to delete message from queue: {e}")
+            logger.error(f"Failed to get tasks from queue: {e}")
+            return []
+
+    def delete_messages_from_queue(self, receipt_handles):
+        """Delete processed messages from queue in batches"""
+        for start in range(0, len(receipt_handles), QUEUE_BATCH_SIZE):
+            batch = receipt_handles[start:start + QUEUE_BATCH_SIZE]
+            try:
+                response = self.sqs_client.delete_message_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {'Id': str(i), 'ReceiptHandle': receipt_handle}
+                        for i, receipt_handle in enumerate(batch)
+                    ]
+                )
+                failed = response.get('Failed', [])
+                logger.info(f"Deleted {len(batch) - len(failed)} messages from queue")
+            except Exception as e:
+                logger.error(f"Failed to delete messages from queue: {e}")
+                continue
+
+            # A batch call can partially fail; retry those entries one at a time
+            for entry in failed:
+                try:
+                    self.sqs_client.delete_message(
+                        QueueUrl=self.queue_url,
+                        ReceiptHandle=batch[int(entry['Id'])]
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to delete message from queue ({entry.get('Code')}): {e}")
+
+    def extend_message_visibility(self, receipt_handles, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT):
+        """Keep still running messages hidden from other consumers"""
+        for start in range(0, len(receipt_handles), QUEUE_BATCH_SIZE):
+            batch = receipt_handles[start:start + QUEUE_BATCH_SIZE]
+            try:
+                self.sqs_client.change_message_visibility_batch(
+                    QueueUrl=self.queue_url,
+                    Entries=[
+                        {'Id': str(i), 'ReceiptHandle': receipt_handle, 'VisibilityTimeout': visibility_timeout}
+                        for i, receipt_handle in enumerate(batch)
+                    ]
+                )
+                logger.info(f"Extended visibility of {len(batch)} messages by {visibility_timeout}s")
+            except Exception as e:
+                logger.error(f"Failed to extend message visibility: {e}")
+
+    def process_queued_tasks(self, tasks, context=None):
+        """Process polled tasks in a thread pool, deleting messages as tasks succeed
+
+        While tasks run, the queue is polled again whenever fewer than
+        QUEUE_WORKER_THREADS + QUEUE_PREFETCH_SIZE tasks are in flight, so the next
+        task is already waiting when a thread frees up. Prefetching only happens
+        when the runtime reports its remaining time. Tasks that have not started
+        by the time that budget drops below MIN_TASK_TIME_BUDGET are released
+        back to the queue.
+
+        Returns a list of (task_id, success) pairs in the order tasks were received;
+        success is None for released tasks.
+        """
+        received = list(tasks)
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=QUEUE_WORKER_THREADS) as executor:
+            pending = {
+                executor.submit(self.process_task, task_data): (task_data, receipt_handle, key)
+                for task_data, receipt_handle, key in received
+            }
+            last_extended = time.monotonic()
+
+            while pending:
+                remaining = get_remaining_time(context)
+                if remaining is not None and remaining < MIN_TASK_TIME_BUDGET:
+                    # Running tasks can't be interrupted, but queued ones can still be cancelled
+                    for future in pending:
+                        future.cancel()
+                elif remaining is not None:
+                    free_slots = QUEUE_WORKER_THREADS + QUEUE_PREFETCH_SIZE - len(pending)
+                    if free_slots > 0:
+                        # Short poll: the loop must keep deleting and extending messages on time
+                        # Messages already in flight here are redeliveries and must not start twice
+                        in_flight = [key for _, _, key in pending.values()]
+                        prefetched = self.get_tasks_from_queue(free_slots, wait_time_seconds=0, skip_keys=in_flight)
+                        for task_data, receipt_handle, key in prefetched:
+                            logger.info("Prefetched task from queue: %s", task_data.get('task_id'))
+                            received.append((task_data, receipt_handle, key))
+                            pending[executor.submit(self.process_task, task_data)] = (task_data, receipt_handle, key)
+
+                done, _ = wait(pending, timeout=QUEUE_WAIT_TICK, return_when=FIRST_COMPLETED)
+
+                succeeded = []
+                released = []
+                for future in done:
+                    task_data, receipt_handle, key = pending.pop(future)
+                    if future.cancelled():
+                        results[task_data.get('task_id')] = None
+                        released.append(receipt_handle)
+                        continue
+
+                    success = future.result()
+                    results[task_data.get('task_id')] = success
+                    if success:
+                        remember_processed(key)
+                        succeeded.append(receipt_handle)
+
+                if succeeded:
+                    self.delete_messages_from_queue(succeeded)
+
+                if released:
+                    logger.info("Releasing %d unstarted tasks back to the queue (time budget exhausted)", len(released))
+                    self.extend_message_visibility(released, visibility_timeout=0)
+
+                if pending and time.monotonic() - last_extended >= VISIBILITY_EXTEND_INTERVAL:
+                    self.extend_message_visibility([receipt_handle for _, receipt_handle, _ in pending.values()])
+                    last_extended = time.monotonic()
+
+        return [(task_data.get('task_id'), results[task_data.get('task_id')]) for task_data, _, _ in received]
+
+    def process_triggered_tasks(self, tasks):
+        """Process tasks delivered by the queue trigger concurrently
+
+        Returns a list of (task_id, success) pairs in the order tasks were given.
+        """
+        with ThreadPoolExecutor(max_workers=QUEUE_WORKER_THREADS) as executor:
+            successes = executor.map(self.process_task, tasks)
+            return [(task_data.get('task_id'), success) for task_data, success in zip(tasks, successes)]
 
     def process_task(self, task_data):
         """Process a single task - convert video to MP3"""
@@ -699,12 +1156,14 @@ class LectureNotesWorker:
 
             transcription = None
             try:
-                transcription = self.transcribe_audio_speechkit(mp3_path, task_id)
+                # SpeechKit reads the MP3 uploaded above, so the audio is not uploaded twice
+                transcription = self.transcribe_audio_speechkit(mp3_storage_key, task_id)
                 logger.info(f"Transcription completed: {len(transcription)} characters")
             except Exception as e:
                 logger.error(f"Transcription failed: {e}")
                 # Mark task as completed but note transcription error in status message
-                self.update_task_status(task_id, 'processing', 90, f"MP3 ready (transcription failed: {str(e)[:100]})")
+                self.update_task_status(task_id, 'processing', 90, f"MP3 ready (transcription failed: {str(e)[:100]})",
+                                        force=True)
 
             # Step 5: Generate abstract using YandexGPT and create PDF
             abstract_url = None
@@ -715,26 +1174,44 @@ class LectureNotesWorker:
                     title = task_data.get('title', 'Лекция')
                     logger.info(f"Generating abstract for lecture: {title}")
 
-                    abstract = self.process_text_with_gpt(transcription, title)
-
-                    if abstract:
-                        # Upload abstract to storage (markdown - kept as backup)
-                        abstract_key = f"abstracts/{task_id}.md"
-                        abstract_url = self.upload_text_to_storage(
-                            abstract,
-                            abstract_key,
-                            content_type='text/markdown'
-                        )
-                        logger.info(f"Abstract uploaded to: {abstract_url}")
-
-                        # Step 5b: Generate PDF from abstract
-                        self.update_task_status(task_id, 'processing', 95, "Generating PDF...")
-                        logger.info("Generating PDF from abstract...")
-
-                        pdf_path = self.generate_pdf_notes(abstract, title, task_id)
-                        pdf_url = self.save_pdf_to_storage(pdf_path, task_id, title)
-
-                        logger.info(f"PDF generated and saved to: {pdf_url}")
+                    # Identical lecture inputs produce identical notes: reuse them when already rendered
+                    notes_digest = notes_content_digest(title, video_url, transcription)
+                    cached_notes = self.restore_cached_notes(notes_digest, task_id)
+                    if cached_notes:
+                        abstract_url, pdf_url = cached_notes
+                    else:
+                        abstract, from_model = self.process_text_with_gpt(transcription, title)
+
+                        if abstract:
+                            # Upload abstract to storage (markdown - kept as backup) in the
+                            # background so it overlaps with PDF rendering and upload
+                            abstract_key = f"abstracts/{task_id}.md"
+                            with ThreadPoolExecutor(max_workers=1) as uploader:
+                                abstract_future = uploader.submit(
+                                    self.upload_text_to_storage,
+                                    abstract,
+                                    abstract_key,
+                                    content_type='text/markdown'
+                                )
+
+                                try:
+                                    # Step 5b: Generate PDF from abstract
+                                    self.update_task_status(task_id, 'processing', 95, "Generating PDF...")
+                                    logger.info("Generating PDF from abstract...")
+
+                                    pdf_buffer = self.generate_pdf_notes(abstract, title, task_id)
+                                    pdf_url = self.save_pdf_to_storage(pdf_buffer, task_id, title)
+
+                                    logger.info(f"PDF generated and saved to: {pdf_url}")
+                                finally:
+                                    # upload_text_to_storage reports failure as None, so this never raises
+                                    abstract_url = abstract_future.result()
+                                    logger.info(f"Abstract uploaded to: {abstract_url}")
+
+                        # Fallback notes are not cached: later identical tasks would keep reusing
+                        # them after YandexGPT recovers
+                        if from_model and abstract_url and pdf_url:
+                            self.cache_generated_notes(notes_digest, task_id)
                 except Exception as e:
                     logger.error(f"Abstract/PDF generation failed: {e}")
                     import traceback
@@ -782,24 +1259,35 @@ class LectureNotesWorker:
             # Cleanup temporary files
             try:
                 if 'temp_dir' in locals() and temp_dir and os.path.exists(temp_dir):
-                    import shutil
                     shutil.rmtree(temp_dir)
                     logger.info(f"Cleaned up temporary directory: {temp_dir}")
             except Exception as e:
                 logger.error(f"Failed to cleanup temp directory: {e}")
 
     def get_video_duration(self, video_path):
-        """Get video duration using moviepy"""
+        """Get video duration in seconds from the container header ffmpeg prints"""
         try:
-            video = VideoFileClip(video_path)
-            duration = video.duration
-            video.close()
-            return duration
-        except:
+            # With no output file ffmpeg only probes the input, prints its header and exits
+            result = subprocess.run(
+                [imageio_ffmpeg.get_ffmpeg_exe(), '-nostdin', '-hide_banner', '-i', video_path],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.PIPE,
+                timeout=30
+            )
+            match = FFMPEG_DURATION_RE.search(result.stderr.decode('utf-8', 'replace'))
+            if not match:
+                return None
+            hours, minutes, seconds = match.groups()
+            return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+        except Exception:
             return None
 
     def process_text_with_gpt(self, transcription_text, title):
-        """Generate structured lecture abstract using YandexGPT Lite"""
+        """Generate structured lecture abstract using YandexGPT Lite
+
+        Returns (abstract, from_model); from_model is False when the basic fallback
+        format was used because the API call failed.
+        """
         try:
             logger.info("=" * 80)
             logger.info("Starting YandexGPT Lite abstract generation")
@@ -807,7 +1295,7 @@ class LectureNotesWorker:
             logger.info(f"Transcription length: {len(transcription_text)} characters")
 
             # Get API key - try dedicated key first, fall back to SpeechKit key
-            api_key = os.getenv('YAGPT_API_KEY') or os.getenv('SPEECHKIT_API_KEY')
+            api_key = self.yagpt_api_key
             if not api_key:
                 logger.warning("No YAGPT_API_KEY or SPEECHKIT_API_KEY found, using fallback format")
 
@@ -871,16 +1359,16 @@ Format your response in Markdown with proper headers."""
             logger.info(f"Request URL: {url}")
             logger.info(f"Model: gpt://{folder_id}/yandexgpt-lite")
 
-            response = requests.post(url, headers=headers, json=request_data, timeout=60)
+            response = self.http.post(url, headers=headers, json=request_data, timeout=60)
 
             logger.info(f"API Response status: {response.status_code}")
 
             if response.status_code != 200:
-                logger.error(f"YandexGPT API failed: {response.status_code}")
-                logger.error(f"Response: {response.text[:500]}")
-                raise Exception(f"YandexGPT API failed: {response.status_code} - {response.text[:200]}")
+                logger.error("YandexGPT API failed: %s", response.status_code)
+                logger.error("Response: %s", response_preview(response))
+                raise Exception(f"YandexGPT API failed: {response.status_code} - {response_preview(response, 200)}")
 
-            result = response.json()
+            result = orjson.loads(response.content)
             logger.info("API call successful")
 
             # Extract the generated text
@@ -905,7 +1393,7 @@ Format your response in Markdown with proper headers."""
 
                 logger.info("Abstract generation completed successfully")
                 logger.info("=" * 80)
-                return markdown_abstract
+                return markdown_abstract, True
             else:
                 logger.error(f"Unexpected API response format: {result}")
                 raise Exception("Unexpected API response format from YandexGPT")
@@ -936,94 +1424,86 @@ Format your response in Markdown with proper headers."""
 
 **Создано:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 **Модель:** Fallback (API unavailable)
-"""
-
-    def generate_pdf_notes(self, processed_text, title, task_id):
-        """Generate PDF from processed lecture notes"""
-        try:
-            logger.info("Generating PDF notes...")
-
-            # Create PDF file path
-            pdf_path = f"/tmp/{task_id}_notes.pdf"
-
-            # Register a font that supports Cyrillic - try multiple sources
-            font_name = 'Helvetica'  # default fallback
-            font_registered = False
-
-            # List of font sources to try, in order
-            font_sources = [
-                '/tmp/Roboto-Regular.ttf',  # Cached download
-                '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # System font
-                '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',  # System font
-                '/usr/share/fonts/truetype/freefont/FreeSans.ttf',  # System font
-            ]
-
-            # Try to find/use an existing font first
-            for font_path in font_sources:
-                if os.path.exists(font_path):
-                    try:
-                        from reportlab.pdfbase import pdfmetrics
-                        from reportlab.pdfbase.ttfonts import TTFont
-                        pdfmetrics.registerFont(TTFont('CyrillicFont', font_path))
-                        font_name = 'CyrillicFont'
-                        font_registered = True
-                        logger.info(f"Using font from: {font_path}")
-                        break
-                    except Exception as e:
-                        logger.warning(f"Failed to register font {font_path}: {e}")
-
-            # If no font found, try downloading one
-            if not font_registered:
-                font_path = '/tmp/Roboto-Regular.ttf'
+""", False
+
+    def get_pdf_font(self):
+        """Name of a registered font that supports Cyrillic, falling back to Helvetica"""
+        global _PDF_FONT_NAME
+        if _PDF_FONT_NAME:
+            return _PDF_FONT_NAME
+
+        # Register a font that supports Cyrillic - try multiple sources
+        font_name = 'Helvetica'  # default fallback
+        font_registered = False
+
+        # List of font sources to try, in order
+        font_sources = [
+            '/tmp/Roboto-Regular.ttf',  # Cached download
+            '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # System font
+            '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',  # System font
+            '/usr/share/fonts/truetype/freefont/FreeSans.ttf',  # System font
+        ]
+
+        # Try to find/use an existing font first
+        for font_path in font_sources:
+            if os.path.exists(font_path):
                 try:
-                    import urllib.request
-                    logger.info("Downloading Roboto font for Cyrillic support...")
                     from reportlab.pdfbase import pdfmetrics
                     from reportlab.pdfbase.ttfonts import TTFont
-                    # Use Google Fonts CDN (more reliable)
-                    urllib.request.urlretrieve(
-                        "https://fonts.gstatic.com/s/roboto/v30/KFOmCnqEu92Fr1Mu4mxP.ttf",
-                        font_path,
-                        timeout=10
-                    )
                     pdfmetrics.registerFont(TTFont('CyrillicFont', font_path))
                     font_name = 'CyrillicFont'
                     font_registered = True
-                    logger.info("Font downloaded and registered successfully")
+                    logger.info(f"Using font from: {font_path}")
+                    break
                 except Exception as e:
-                    logger.error(f"Font download failed: {e}, Cyrillic may not display")
-                    font_name = 'Helvetica'
+                    logger.warning(f"Failed to register font {font_path}: {e}")
 
-            # Create PDF document
-            doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-            story = []
+        # If no font found, try downloading one
+        if not font_registered:
+            font_path = '/tmp/Roboto-Regular.ttf'
+            try:
+                logger.info("Downloading Roboto font for Cyrillic support...")
+                from reportlab.pdfbase import pdfmetrics
+                from reportlab.pdfbase.ttfonts import TTFont
+                # Use Google Fonts CDN (more reliable)
+                response = self.http.get(
+                    "https://fonts.gstatic.com/s/roboto/v30/KFOmCnqEu92Fr1Mu4mxP.ttf",
+                    timeout=10
+                )
+                response.raise_for_status()
+                with open(font_path, 'wb') as f:
+                    f.write(response.content)
+                pdfmetrics.registerFont(TTFont('CyrillicFont', font_path))
+                font_name = 'CyrillicFont'
+                font_registered = True
+                logger.info("Font downloaded and registered successfully")
+            except Exception as e:
+                logger.error(f"Font download failed: {e}, Cyrillic may not display")
+                font_name = 'Helvetica'
 
-            # Get styles and customize with Cyrillic font
-            styles = getSampleStyleSheet()
+        if font_registered:
+            # Registration is process-wide, so later PDFs skip the font lookup entirely
+            _PDF_FONT_NAME = font_name
+        return font_name
 
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Title'],
-                fontName=font_name,
-                fontSize=16,
-                leading=22
-            )
+    def generate_pdf_notes(self, processed_text, title, task_id, output=None):
+        """Generate PDF from processed lecture notes into a binary stream
 
-            heading_style = ParagraphStyle(
-                'CustomHeading',
-                parent=styles['Heading1'],
-                fontName=font_name,
-                fontSize=12,
-                leading=16
-            )
+        Renders into a new in-memory buffer unless a writable output stream is
+        given. Returns the stream rewound to the start.
+        """
+        try:
+            logger.info(f"Generating PDF notes for task {task_id}...")
 
-            normal_style = ParagraphStyle(
-                'CustomNormal',
-                parent=styles['Normal'],
-                fontName=font_name,
-                fontSize=10,
-                leading=14
-            )
+            # Render into memory by default - the PDF goes straight to object storage, /tmp is never touched
+            pdf_buffer = output if output is not None else BytesIO()
+
+            font_name = self.get_pdf_font()
+            title_style, heading_style, normal_style = get_pdf_styles(font_name)
+
+            # Create PDF document
+            doc = SimpleDocTemplate(pdf_buffer, pagesize=letter)
+            story = []
 
             # Add title (escape HTML special chars)
             title_paragraph = Paragraph(html.escape(title), title_style)
@@ -1037,51 +1517,24 @@ Format your response in Markdown with proper headers."""
             story.append(Spacer(1, 20))
 
             # Process text into paragraphs
-            lines = processed_text.split('\n')
-            current_section = []
-
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    if current_section:
-                        # Join current section into a paragraph
-                        paragraph_text = ' '.join(current_section)
-                        paragraph = Paragraph(html.escape(paragraph_text), normal_style)
-                        story.append(paragraph)
-                        story.append(Spacer(1, 6))
-                        current_section = []
-                elif line.isupper() and len(line) < 50:
-                    # Likely a heading
-                    if current_section:
-                        paragraph_text = ' '.join(current_section)
-                        paragraph = Paragraph(html.escape(paragraph_text), normal_style)
-                        story.append(paragraph)
-                        current_section = []
-
-                    heading = Paragraph(html.escape(line), heading_style)
-                    story.append(heading)
-                    story.append(Spacer(1, 12))
-                else:
-                    current_section.append(line)
-
-            # Add any remaining text
-            if current_section:
-                paragraph_text = ' '.join(current_section)
-                paragraph = Paragraph(html.escape(paragraph_text), normal_style)
-                story.append(paragraph)
+            for is_heading, text, space_after in iter_pdf_blocks(processed_text):
+                story.append(Paragraph(html.escape(text), heading_style if is_heading else normal_style))
+                if space_after:
+                    story.append(Spacer(1, space_after))
 
             # Generate PDF
             doc.build(story)
 
-            logger.info(f"PDF generated successfully: {pdf_path}")
-            return pdf_path
+            logger.info(f"PDF generated successfully: {pdf_buffer.tell()} bytes")
+            pdf_buffer.seek(0)
+            return pdf_buffer
 
         except Exception as e:
             logger.error(f"Failed to generate PDF: {e}")
             raise Exception(f"PDF generation failed: {e}")
 
-    def save_pdf_to_storage(self, pdf_path, task_id, title):
-        """Save generated PDF to object storage"""
+    def save_pdf_to_storage(self, pdf_buffer, task_id, title):
+        """Save generated PDF (a file-like object) to object storage"""
         try:
             logger.info(f"Saving PDF to storage for task {task_id}")
 
@@ -1089,26 +1542,26 @@ Format your response in Markdown with proper headers."""
             pdf_filename = f"{task_id}_lecture_notes.pdf"
             storage_key = f"notes/{pdf_filename}"
 
-            # Read PDF file
-            with open(pdf_path, 'rb') as pdf_file:
-                pdf_content = pdf_file.read()
-
             # Upload to object storage
-            self.s3_client.put_object(
-                Bucket=self.storage_bucket,
-                Key=storage_key,
-                Body=pdf_content,
-                ContentType='application/pdf',
-                ACL='public-read',
-                Metadata={
-                    'task_id': task_id,
-                    'title': title,
-                    'generated_at': datetime.now().isoformat()
-                }
+            self.s3_client.upload_fileobj(
+                pdf_buffer,
+                self.storage_bucket,
+                storage_key,
+                ExtraArgs={
+                    'ContentType': 'application/pdf',
+                    'ACL': 'public-read',
+                    # S3 metadata is ASCII-only and capped at 2 KB, so the title is URL-encoded and truncated
+                    'Metadata': {
+                        'task_id': task_id,
+                        'title': quote(title[:256], safe=''),
+                        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds')
+                    }
+                },
+                Config=self.transfer_config
             )
 
             # Generate public URL
-            pdf_url = f"https://storage.yandexcloud.net/{self.storage_bucket}/{storage_key}"
+            pdf_url = self._url_prefix + storage_key
 
             logger.info(f"PDF saved successfully: {pdf_url}")
             return pdf_url
@@ -1179,115 +1632,168 @@ Format your response in Markdown with proper headers."""
             return 0
 
 
+# Worker instance shared across warm invocations so boto3 clients keep their connection pools
+_WORKER = None
+
+
+def _json(obj):
+    """Serialize a handler response body"""
+    return orjson.dumps(obj).decode('utf-8')
+
+
+def _response(status_code, payload):
+    """Build a handler response; every return path goes through here"""
+    return {
+        'statusCode': status_code,
+        'body': _json(payload)
+    }
+
+
+# Idle responses never change, so their bodies are serialized once per container
+_RESP_POLLING_DISABLED = _response(200, {'message': 'No triggered messages', 'status': 'idle'})
+_RESP_NO_TASKS = _response(200, {'message': 'No tasks in queue', 'status': 'idle'})
+
+
+def is_timer_event(event):
+    """True for invocations from a timer trigger, which also arrive as 'messages'"""
+    messages = event.get('messages') or []
+    return bool(messages) and all(
+        isinstance(message, dict)
+        and isinstance(message.get('event_metadata'), dict)
+        and str(message['event_metadata'].get('event_type', '')).endswith('TimerMessage')
+        for message in messages
+    )
+
+
+def _get_worker():
+    """Return the shared worker, creating it on the first invocation"""
+    global _WORKER
+    if _WORKER is None:
+        _WORKER = LectureNotesWorker()
+    return _WORKER
+
+
 def handler(event, context):
     """Main handler for Yandex Cloud Functions"""
     logger.info("Worker function triggered")
-    logger.info(f"Event structure: {str(event)[:200]}...")
 
     try:
-        worker = LectureNotesWorker()
-        logger.info("Worker initialized")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("event keys=%s n_msgs=%d", list(event), len(event.get('messages') or []))
+
+        worker = _get_worker()
 
         # Run cleanup on every invocation (checks for files older than 1 hour)
         try:
             worker.cleanup_old_files(max_age_hours=1)
         except Exception as e:
-            logger.error(f"Cleanup failed (continuing anyway): {e}")
-
-        # Handle triggered messages from queue (new approach)
-        if 'messages' in event:
-            logger.info(f"Processing {len(event['messages'])} triggered messages")
-
+            logger.error("Cleanup failed (continuing anyway): %s", e)
+
+        # Handle triggered messages from queue (new approach). The trigger deletes the
+        # whole batch itself once the invocation returns without raising, and its
+        # messages carry no receipt handles, so nothing is deleted from here.
+        timer_event = is_timer_event(event)
+        if 'messages' in event and not timer_event:
+            logger.info("Processing %d triggered messages", len(event['messages']))
+
+            tasks = []
+            task_keys = []
+            message_ids = []
+            results = []
+            duplicates = 0
             for message in event['messages']:
-                logger.info(f"Message details: {message.get('details', {})}")
+                message_id = None
+                try:
+                    queue_message = message['details']['message']
+                    message_id = queue_message.get('message_id')
+                    message_body = queue_message['body']
+
+                    # Skip repeats within the batch and redeliveries of completed messages before parsing
+                    key = message_dedup_key(message_body)
+                    if key in task_keys or is_recently_processed(key):
+                        duplicates += 1
+                        continue
+
+                    # Extract task data from message
+                    task_data = parse_message_body(message_body)
+                except (KeyError, TypeError, AttributeError, orjson.JSONDecodeError) as e:
+                    # A malformed message is reported on its own instead of failing the whole batch
+                    logger.exception("Malformed triggered message")
+                    results.append({'message_id': message_id, 'task_id': None, 'status': 'malformed', 'error': str(e)})
+                    continue
 
-                # Extract task data from message
-                message_body = message['details']['message']['body']
-                task_data = json.loads(message_body)
-                task_id = task_data.get('task_id')
+                logger.debug("Triggered task: %s", task_data.get('task_id'))
+                tasks.append(task_data)
+                task_keys.append(key)
+                message_ids.append(message_id)
 
-                logger.info(f"Processing triggered task: {task_id}")
+            if duplicates:
+                logger.info("Skipped %d duplicate triggered messages", duplicates)
 
-                # Process the task
-                success = worker.process_task(task_data)
+            # Tasks are mostly waiting on downloads and Yandex APIs, so they run side by side
+            outcomes = zip(task_keys, message_ids, worker.process_triggered_tasks(tasks))
+            for key, message_id, (task_id, success) in outcomes:
+                results.append({'message_id': message_id, 'task_id': task_id, 'status': 'success' if success else 'failed'})
 
                 if success:
-                    logger.info(f"Task {task_id} completed successfully")
-                    return {
-                        'statusCode': 200,
-                        'body': json.dumps({
-                            'message': f'Task {task_id} processed successfully',
-                            'status': 'success'
-                        })
-                    }
+                    remember_processed(key)
+                    logger.info("Task %s completed successfully", task_id)
                 else:
-                    logger.error(f"Task {task_id} failed")
-                    return {
-                        'statusCode': 500,
-                        'body': json.dumps({
-                            'message': f'Task {task_id} processing failed',
-                            'status': 'failed'
-                        })
-                    }
+                    logger.error("Task %s failed", task_id)
+
+            # Failures are reported per message rather than through the status code: the trigger
+            # acknowledges the batch either way, and failed tasks are already marked in storage.
+            # batchItemFailures follows the partial batch response convention for any consumer of the result.
+            succeeded = sum(1 for result in results if result['status'] == 'success')
+            return _response(200, {
+                'message': f'{succeeded} of {len(results)} triggered tasks processed successfully',
+                'status': 'partial' if succeeded < len(results) else 'success',
+                'results': results,
+                'duplicates_skipped': duplicates,
+                'batchItemFailures': [
+                    {'itemIdentifier': result['message_id']}
+                    for result in results
+                    if result['status'] != 'success' and result['message_id']
+                ]
+            })
+
+        # Fallback: try polling the queue directly (original approach). The queue trigger
+        # delivers tasks on its own, so this only runs on a schedule or when explicitly enabled.
+        if not timer_event and os.environ.get('WORKER_ALLOW_POLL') != '1':
+            logger.info("No triggered messages, queue polling disabled")
+            return _RESP_POLLING_DISABLED
 
-        # Fallback: try polling the queue directly (original approach)
         logger.info("No triggered messages, trying queue polling")
-        task_data, receipt_handle = worker.get_task_from_queue()
-
-        if task_data:
-            logger.info(f"Received task from queue: {task_data['task_id']}")
-            success = worker.process_task(task_data)
-
-            if success:
-                logger.info(f"Task {task_data['task_id']} completed successfully")
-                worker.delete_message_from_queue(receipt_handle)
-                return {
-                    'statusCode': 200,
-                    'body': json.dumps({
-                        'message': f'Task {task_data["task_id"]} processed successfully',
-                        'status': 'success'
-                    })
-                }
+        tasks = worker.get_tasks_from_queue(wait_time_seconds=QUEUE_FALLBACK_WAIT_TIME)
+
+        if tasks:
+            logger.info("Received %d tasks from queue", len(tasks))
+            results = worker.process_queued_tasks(tasks, context)
+            failed = [task_id for task_id, success in results if success is False]
+            released = [task_id for task_id, success in results if success is None]
+
+            if not failed:
+                logger.info("%d tasks completed successfully, %d released", len(results) - len(released), len(released))
+                return _response(200, {
+                    'message': f'{len(results) - len(released)} tasks processed successfully',
+                    'status': 'success',
+                    'released_task_ids': released
+                })
             else:
-                logger.error(f"Task {task_data['task_id']} processing failed")
-                return {
-                    'statusCode': 500,
-                    'body': json.dumps({
-                        'message': f'Task {task_data["task_id"]} processing failed',
-                        'status': 'failed'
-                    })
-                }
+                logger.error("%d of %d tasks failed: %s", len(failed), len(results), failed)
+                return _response(500, {
+                    'message': f'{len(failed)} of {len(results)} tasks processing failed',
+                    'status': 'failed',
+                    'failed_task_ids': failed
+                })
         else:
             # No tasks in queue
             logger.info("No tasks in queue")
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'No tasks in queue',
-                    'status': 'idle'
-                })
-            }
+            return _RESP_NO_TASKS
 
     except Exception as e:
-        logger.error(f"Worker error: {e}")
-        return {
-            'statusCode': 500,
-            'body': json.dumps({
-                'message': str(e),
-                'status': 'error'
-            })
-        }
-
-if __name__ == '__main__':
-    # For local testing
-    worker = LectureNotesWorker()
-
-    # Example task for testing
-    example_task = {
-        'task_id': str(uuid.uuid4()),
-        'title': 'Test Lecture',
-        'video_url': 'https://example.com/test.mp4',
-        'description': 'Test description'
-    }
-
-    worker.process_task(example_task)
\ No newline at end of file
+        logger.error("Worker error: %s", e)
+        return _response(500, {
+            'message': str(e),
+            'status': 'error'
+        })
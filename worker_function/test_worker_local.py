@@ -0,0 +1,18 @@
+import uuid
+
+from main import LectureNotesWorker
+
+
+if __name__ == '__main__':
+    # For local testing
+    worker = LectureNotesWorker()
+
+    # Example task for testing
+    example_task = {
+        'task_id': str(uuid.uuid4()),
+        'title': 'Test Lecture',
+        'video_url': 'https://example.com/test.mp4',
+        'description': 'Test description'
+    }
+
+    worker.process_task(example_task)